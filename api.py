@@ -1,65 +1,617 @@
 # API Flask para criar agendamentos no CashBarber via Selenium.
 #
-# Este serviço expõe um endpoint ``/create-appointment`` que recebe as
-# informações necessárias e automatiza o preenchimento do painel CashBarber
-# usando Selenium WebDriver.  A configuração do WebDriver foi ajustada para
-# utilizar o ``new headless`` do Chrome e definir corretamente o idioma e
-# locale para pt‑BR, garantindo que campos de data e hora sejam
-# interpretados corretamente em ambientes sem interface gráfica【972299686105822†L34-L46】.
+# Este serviço expõe os endpoints ``/create-appointment`` e
+# ``/create-appointments`` (lote) que recebem as informações necessárias e
+# automatizam o preenchimento do painel CashBarber usando Selenium
+# WebDriver.  Os drivers são criados e encerrados em ``driver_factory``.
 
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
+import orjson
+import hashlib
+import logging
 import os
-import sys
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from schedule_cashbarber import (
+    DATE_FORMATS,
+    LoginError,
     login_to_cashbarber,
     open_appointments_page,
     create_appointment,
+    forget_session,
+    parse_date,
+    session_key,
+    watch_popups,
 )
+from driver_factory import create_driver, install_shutdown_hooks, prelaunch_drivers, quit_driver
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import traceback
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by ``orjson``.
+
+    ``jsonify`` and ``request.get_json`` go through ``app.json``, so swapping
+    the provider moves all (de)serialization to orjson without touching the
+    handlers.  Responses are built from orjson's bytes directly.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+logger = logging.getLogger(__name__)
+
+# Maximum number of logged-in browsers kept per set of credentials
+DRIVER_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", 2))
+# Seconds a request waits for a pooled browser to become free
+DRIVER_CHECKOUT_TIMEOUT = float(os.environ.get("DRIVER_CHECKOUT_TIMEOUT", 90))
+
+# Logged-in browsers across all credentials, idle or checked out.  Keep it
+# plus DRIVER_SPARES within the browser host's session limit (e.g. the
+# Selenium node's SE_NODE_MAX_SESSIONS).
+MAX_LIVE_DRIVERS = int(os.environ.get("MAX_LIVE_DRIVERS", 4))
+
+# Logged-in drivers keyed by an HMAC of the credentials (session_key), so a
+# session is only reused by callers presenting exactly the same ones and no
+# password is kept as a key.  Pools are ordered from least to most recently
+# used: at MAX_LIVE_DRIVERS an idle driver of the stalest other account is
+# evicted, and a pool is dropped along with its last driver.
+_pools: "OrderedDict[str, queue.Queue]" = OrderedDict()
+_pool_sizes: Dict[str, int] = {}
+_pools_lock = threading.Lock()
+
+# Requests a driver serves before it is replaced, so the long-lived Chrome
+# processes do not keep growing (0 keeps drivers until they fail)
+DRIVER_MAX_USES = int(os.environ.get("DRIVER_MAX_USES", 50))
+_driver_uses: Dict[webdriver.Chrome, int] = {}
+
+# A driver idle in its pool for longer than this (seconds) has its panel
+# session checked, and renewed if CashBarber expired it, before being handed
+# out again (0 disables the check)
+SESSION_CHECK_IDLE = float(os.environ.get("SESSION_CHECK_IDLE", 300))
+_idle_since: Dict[webdriver.Chrome, float] = {}
+
+REQUIRED_FIELDS = frozenset(
+    {
+        "email",
+        "password",
+        "client",
+        "date",
+        "start_time",
+        "end_time",
+        "branch",
+        "professional",
+        "services",
+    }
+)
+# Fields of each item in a /create-appointments batch (credentials are given
+# once for the whole batch)
+APPOINTMENT_FIELDS = REQUIRED_FIELDS - {"email", "password"}
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 20))
+# Drivers a batch may use at once (the body's "parallel" overrides the
+# default), capped to stay within the pool and clear of CashBarber's rate
+# limits.  Extra shards start up to BATCH_LOGIN_JITTER seconds late so their
+# logins do not hit the site together.
+BATCH_PARALLELISM = int(os.environ.get("BATCH_PARALLELISM", 1))
+MAX_BATCH_PARALLELISM = min(
+    int(os.environ.get("MAX_BATCH_PARALLELISM", 4)), DRIVER_POOL_SIZE, MAX_LIVE_DRIVERS
+)
+BATCH_LOGIN_JITTER = float(os.environ.get("BATCH_LOGIN_JITTER", 1.0))
+
+# Admission control: at most MAX_PENDING_REQUESTS appointments are queued or
+# running at once; the rest are rejected with 503 instead of piling up Chrome
+# processes.  Selenium flows run on DRIVER_POOL_SIZE worker threads.
+MAX_PENDING_REQUESTS = int(os.environ.get("MAX_PENDING_REQUESTS", 2 * DRIVER_POOL_SIZE))
+ADMISSION_TIMEOUT = float(os.environ.get("ADMISSION_TIMEOUT", 0.5))
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", 30))
+_admission = threading.BoundedSemaphore(MAX_PENDING_REQUESTS)
+_executor = ThreadPoolExecutor(max_workers=DRIVER_POOL_SIZE, thread_name_prefix="cashbarber")
+
+# Identical payloads (e.g. client retries) share one browser flow: requests
+# arriving while it runs wait on its Future, and a successful outcome is
+# remembered for DEDUP_TTL seconds.  Entries map to (future, expires_at).
+DEDUP_TTL = float(os.environ.get("DEDUP_TTL", 60))
+_inflight: Dict[str, Tuple[Future, float]] = {}
+_inflight_lock = threading.Lock()
+
 
+class _Busy(Exception):
+    """Raised when a request is turned away for lack of capacity."""
+
+
+def _drop_pool_if_empty(key: str) -> None:
+    """Forget ``key``'s pool once it has no drivers left (call with the lock held)."""
+    if _pool_sizes.get(key) == 0 and _pools[key].empty():
+        del _pools[key], _pool_sizes[key]
+
+
+def _evict_idle_driver(keep: str) -> Optional[webdriver.Chrome]:
+    """Take an idle driver from the least recently used pool other than ``keep``.
+
+    Call with the lock held; the caller quits the returned driver.
+    """
+    for key, pool in _pools.items():
+        if key == keep:
+            continue
+        try:
+            driver = pool.get_nowait()
+        except queue.Empty:
+            continue
+        _pool_sizes[key] -= 1
+        _driver_uses.pop(driver, None)
+        _idle_since.pop(driver, None)
+        _drop_pool_if_empty(key)
+        return driver
+    return None
+
+
+def _reserve_slot(key: str) -> bool:
+    """Reserve room for one more driver under ``key``, creating its pool.
+
+    Fails while the pool is full, or while ``MAX_LIVE_DRIVERS`` are alive and
+    no other account has an idle driver to evict.
+    """
+    victim = None
+    with _pools_lock:
+        if _pool_sizes.get(key, 0) >= DRIVER_POOL_SIZE:
+            return False
+        if sum(_pool_sizes.values()) >= MAX_LIVE_DRIVERS:
+            victim = _evict_idle_driver(key)
+            if victim is None:
+                return False
+        if key not in _pools:
+            _pools[key] = queue.Queue(maxsize=DRIVER_POOL_SIZE)
+            _pool_sizes[key] = 0
+        _pools.move_to_end(key)
+        _pool_sizes[key] += 1
+    if victim is not None:
+        # Gone before the caller starts its browser, so the limit holds
+        quit_driver(victim)
+    return True
+
+
+def _release_slot(key: str) -> None:
+    with _pools_lock:
+        _pool_sizes[key] -= 1
+        _drop_pool_if_empty(key)
+
+
+def _is_alive(driver: webdriver.Chrome) -> bool:
+    """Cheap health probe used before handing a pooled driver to a request."""
+    try:
+        return driver.execute_script("return 1") == 1
+    except Exception:
+        return False
+
+
+def _new_logged_in_driver(email: str, password: str) -> webdriver.Chrome:
+    driver = create_driver()
+    try:
+        login_to_cashbarber(driver, email, password)
+    except Exception:
+        quit_driver(driver)
+        raise
+    return driver
+
+
+def _add_pooled_driver(email: str, password: str) -> bool:
+    """Create one logged-in driver and park it in the pool.
+
+    Returns False if there is no room for it; errors propagate once the
+    reserved room is released.
+    """
+    key = session_key(email, password)
+    if not _reserve_slot(key):
+        return False
+    try:
+        driver = _new_logged_in_driver(email, password)
+    except Exception:
+        # Releasing the slot drops the pool again: rejected credentials
+        # keep no browser around
+        _release_slot(key)
+        raise
+    with _pools_lock:
+        _idle_since[driver] = time.monotonic()
+        _pools[key].put_nowait(driver)
+    return True
+
+
+def _replenish(email: str, password: str) -> bool:
+    """Like ``_add_pooled_driver``, for background threads: errors are logged.
+
+    Returns False if no driver was added.
+    """
+    try:
+        return _add_pooled_driver(email, password)
+    except LoginError as e:
+        logger.warning("Not warming driver pool: %s", e)
+    except Exception:
+        logger.exception("Error warming driver pool")
+    return False
+
+
+def checkout_driver(email: str, password: str) -> webdriver.Chrome:
+    """Take a healthy, already authenticated driver from the pool.
+
+    A pooled driver that sat idle for ``SESSION_CHECK_IDLE`` seconds has its
+    panel session checked first and is logged in again if it expired.
+
+    A new driver is created (and logged in) on the caller's thread while the
+    pool for these credentials has not reached ``DRIVER_POOL_SIZE`` and
+    ``MAX_LIVE_DRIVERS`` allows it; otherwise the call blocks until another
+    request returns a driver or room frees up.
+
+    Raises:
+        queue.Empty: If no driver became available within
+            ``DRIVER_CHECKOUT_TIMEOUT`` seconds.
+    """
+    key = session_key(email, password)
+    deadline = time.monotonic() + DRIVER_CHECKOUT_TIMEOUT
+    while True:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is not None:
+                _pools.move_to_end(key)
+        try:
+            if pool is None:
+                raise queue.Empty
+            driver = pool.get_nowait()
+        except queue.Empty:
+            if _reserve_slot(key):
+                try:
+                    return _new_logged_in_driver(email, password)
+                except Exception:
+                    _release_slot(key)
+                    raise
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise queue.Empty
+            # Short waits: room can also open up in another account's pool,
+            # and this pool may be replaced while waiting
+            try:
+                if pool is None:
+                    time.sleep(min(remaining, 0.5))
+                    continue
+                driver = pool.get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                continue
+        with _pools_lock:
+            idle = time.monotonic() - _idle_since.pop(driver, time.monotonic())
+        if _is_alive(driver):
+            if not SESSION_CHECK_IDLE or idle < SESSION_CHECK_IDLE:
+                return driver
+            try:
+                # Returns at once while the panel still opens logged in;
+                # otherwise logs in again on the same browser
+                login_to_cashbarber(driver, email, password)
+                return driver
+            except LoginError:
+                _forget_uses(driver)
+                quit_driver(driver)
+                _release_slot(key)
+                raise
+            except Exception:
+                logger.warning("Could not renew the session of an idle driver; replacing it", exc_info=True)
+        # Dead browser or session: drop it and retry
+        _forget_uses(driver)
+        quit_driver(driver)
+        _release_slot(key)
+
+
+def _forget_uses(driver: webdriver.Chrome) -> None:
+    with _pools_lock:
+        _driver_uses.pop(driver, None)
+        _idle_since.pop(driver, None)
+
+
+def release_driver(email: str, password: str, driver: webdriver.Chrome) -> None:
+    """Return a driver to its pool after a successful request.
+
+    Once it has served ``DRIVER_MAX_USES`` requests it is recycled instead.
+    """
+    key = session_key(email, password)
+    with _pools_lock:
+        uses = _driver_uses[driver] = _driver_uses.get(driver, 0) + 1
+        if not DRIVER_MAX_USES or uses < DRIVER_MAX_USES:
+            _idle_since[driver] = time.monotonic()
+            _pools[key].put_nowait(driver)
+            return
+    # Quit off the request path; the slot frees up once it is gone
+    threading.Thread(
+        target=discard_driver, args=(email, password, driver), kwargs={"failed": False}, daemon=True
+    ).start()
+
+
+def discard_driver(email: str, password: str, driver: webdriver.Chrome, failed: bool = True) -> None:
+    """Quit a driver left in an unknown state.
+
+    After a ``failed`` flow the account's panel session may have expired
+    without the panel asking for a login, so the cached session and the
+    profile's owner marker are dropped first and the next driver logs in.
+
+    Only the default account's pool is warmed again in the background; other
+    accounts get a driver on their next request, so a one-off account does
+    not keep a browser parked.
+    """
+    _forget_uses(driver)
+    if failed:
+        forget_session(driver, email, password)
+    quit_driver(driver)
+    key = session_key(email, password)
+    _release_slot(key)
+    if key == _WARM_KEY:
+        threading.Thread(target=_replenish, args=(email, password), daemon=True).start()
+
+
+# Account whose pool is pre-created at start-up and kept warm
+_WARM_EMAIL = os.environ.get("CASHBARBER_EMAIL")
+_WARM_PASSWORD = os.environ.get("CASHBARBER_PASSWORD")
+_WARM_KEY = session_key(_WARM_EMAIL, _WARM_PASSWORD) if _WARM_EMAIL and _WARM_PASSWORD else None
+
+
+# Longest pause (seconds) between attempts to warm the pool while browsers
+# cannot be started yet (e.g. the Selenium server is still coming up)
+WARM_RETRY_MAX = float(os.environ.get("WARM_RETRY_MAX", 60))
+
+
+def _warm_pool() -> None:
+    """Pre-create logged-in drivers for the default account, if configured.
+
+    Failed attempts are retried with exponential backoff; rejected
+    credentials stop the warm-up.
+    """
+    if _WARM_KEY is None:
+        return
+    delay = 1.0
+    for _ in range(DRIVER_POOL_SIZE):
+        while True:
+            try:
+                if not _add_pooled_driver(_WARM_EMAIL, _WARM_PASSWORD):
+                    return
+                break
+            except LoginError as e:
+                logger.warning("Not warming driver pool: %s", e)
+                return
+            except Exception:
+                logger.warning("Error warming driver pool; retrying in %.0f s", delay, exc_info=True)
+                time.sleep(delay)
+                delay = min(delay * 2, WARM_RETRY_MAX)
 
-def create_driver() -> webdriver.Chrome:
-    """Create a Chrome WebDriver instance with proper options for server environment.
 
-    The driver is configured to run in headless mode using Chrome's *new* headless
-    implementation.  This ensures that language arguments such as ``--lang=pt-BR``
-    are respected【972299686105822†L34-L46】.  It also sets the user agent and
-    disables automation flags to reduce detection by the target site.
+def start_background_tasks() -> None:
+    """Install the shutdown hooks and start the spare browsers and the warm pool.
 
-    Returns:
-        webdriver.Chrome: A configured Chrome WebDriver instance.
+    Called by the server entry point (wsgi.py), so importing this module
+    launches no browser.
     """
-    options = Options()
-    # Define a realistic user‑agent to avoid basic bot detection
-    options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36"
+    install_shutdown_hooks()
+    prelaunch_drivers()
+    threading.Thread(target=_warm_pool, daemon=True).start()
+
+
+def _fill_appointment(driver: webdriver.Chrome, data: dict) -> None:
+    open_appointments_page(driver)
+    watch_popups(driver)
+    create_appointment(
+        driver,
+        client_name=data["client"],
+        date=data["date"],
+        start_time=data["start_time"],
+        end_time=data["end_time"],
+        branch_name=data["branch"],
+        professional_name=data["professional"],
+        services=data["services"],
     )
-    # Use Chrome's new headless mode so that --lang is honoured
-    options.add_argument("--headless=new")
-    # Other recommended flags for headless environments
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    # Force the browser to use the Brazilian Portuguese locale
-    options.add_argument("--lang=pt-BR")
-    options.add_experimental_option(
-        "prefs",
-        {
-            "intl.accept_languages": "pt-BR,pt,en-US,en",
-        },
+
+
+def _run_appointment(data: dict) -> None:
+    """Create one appointment on a pooled driver (runs on a worker thread)."""
+    driver = checkout_driver(data["email"], data["password"])
+    try:
+        _fill_appointment(driver, data)
+    except Exception:
+        discard_driver(data["email"], data["password"], driver)
+        raise
+    release_driver(data["email"], data["password"], driver)
+
+
+def _run_batch(email: str, password: str, appointments: List[dict]) -> List[dict]:
+    """Create appointments in order on one pooled driver (runs on a worker thread).
+
+    A failed item is reported and its driver, left in an unknown state, is
+    replaced before the next item.  Only the first checkout may raise; after
+    that, items that cannot get a driver are reported as failed so the
+    appointments already created are never lost to an error response.
+    """
+    results = []
+    driver = checkout_driver(email, password)
+    try:
+        for i, appointment in enumerate(appointments):
+            if driver is None:
+                try:
+                    driver = checkout_driver(email, password)
+                except Exception as e:
+                    error = "No browser session available" if isinstance(e, queue.Empty) else str(e)
+                    results.extend({"success": False, "error": error} for _ in appointments[i:])
+                    break
+            try:
+                _fill_appointment(driver, appointment)
+            except Exception as e:
+                logger.exception("Error creating appointment %d of batch", i)
+                discard_driver(email, password, driver)
+                driver = None
+                results.append({"success": False, "error": str(e)})
+            else:
+                results.append({"success": True, "data": _summary(appointment)})
+    finally:
+        if driver is not None:
+            release_driver(email, password, driver)
+    return results
+
+
+def _run_shard(email: str, password: str, appointments: List[dict], index: int) -> List[dict]:
+    if index and BATCH_LOGIN_JITTER > 0:
+        time.sleep(random.uniform(0, BATCH_LOGIN_JITTER))
+    return _run_batch(email, password, appointments)
+
+
+def _run_batch_parallel(email: str, password: str, appointments: List[dict], parallel: int) -> List[dict]:
+    """Split a batch into contiguous shards run on separate drivers.
+
+    One admission slot is needed per shard: the first is waited for as
+    usual, further ones are only taken if free right away, so a busy server
+    degrades to fewer shards instead of rejecting the batch.
+    """
+    if not _admission.acquire(timeout=ADMISSION_TIMEOUT):
+        raise _Busy("Too many pending appointments, try again later")
+    admitted = 1
+    try:
+        while admitted < min(parallel, len(appointments)) and _admission.acquire(blocking=False):
+            admitted += 1
+        size = -(-len(appointments) // admitted)
+        shards = [appointments[i:i + size] for i in range(0, len(appointments), size)]
+        futures = [
+            _executor.submit(_run_shard, email, password, shard, n) for n, shard in enumerate(shards)
+        ]
+        results, unavailable, rejected = [], 0, []
+        for shard, future in zip(shards, futures):
+            try:
+                results.extend(future.result())
+            except queue.Empty:
+                unavailable += 1
+                results.extend({"success": False, "error": "No browser session available"} for _ in shard)
+            except LoginError as e:
+                rejected.append(e)
+                results.extend({"success": False, "error": str(e)} for _ in shard)
+            except Exception as e:
+                logger.exception("Error running appointment batch shard")
+                results.extend({"success": False, "error": str(e)} for _ in shard)
+        if unavailable == len(shards):
+            raise _Busy("No browser session available, try again later")
+        if len(rejected) == len(shards):
+            raise rejected[0]
+        return results
+    finally:
+        for _ in range(admitted):
+            _admission.release()
+
+
+def _run_admitted(fn, *args):
+    """Run ``fn`` on the Selenium executor if admission control lets it in."""
+    if not _admission.acquire(timeout=ADMISSION_TIMEOUT):
+        raise _Busy("Too many pending appointments, try again later")
+    try:
+        return _executor.submit(fn, *args).result()
+    except queue.Empty:
+        raise _Busy("No browser session available, try again later") from None
+    finally:
+        _admission.release()
+
+
+def _request_key(data: dict) -> str:
+    return hashlib.blake2b(orjson.dumps(data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _claim(key: str) -> Tuple[Future, bool]:
+    """Return the Future for ``key`` and whether the caller must produce it."""
+    now = time.monotonic()
+    with _inflight_lock:
+        for stale in [k for k, (_, expires) in _inflight.items() if expires <= now]:
+            del _inflight[stale]
+        entry = _inflight.get(key)
+        if entry is not None:
+            return entry[0], False
+        future = Future()
+        _inflight[key] = (future, float("inf"))
+        return future, True
+
+
+def _create_once(data: dict) -> None:
+    """Run the appointment flow unless an identical request already did."""
+    key = _request_key(data)
+    future, owner = _claim(key)
+    if not owner:
+        return future.result()
+    try:
+        _run_admitted(_run_appointment, data)
+    except BaseException as e:
+        # Failures are not cached so that a retry gets a fresh attempt
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        future.set_exception(e)
+        raise
+    with _inflight_lock:
+        _inflight[key] = (future, time.monotonic() + DEDUP_TTL)
+    future.set_result(None)
+
+
+# DATE_FORMATS as clients write them, e.g. "YYYY-MM-DD, ... or DDMMYYYY"
+_DATE_FORMAT_NAMES = [f.replace("%Y", "YYYY").replace("%m", "MM").replace("%d", "DD") for f in DATE_FORMATS]
+_DATE_FORMATS_TEXT = ", ".join(_DATE_FORMAT_NAMES[:-1]) + " or " + _DATE_FORMAT_NAMES[-1]
+
+
+def _validation_error(data: dict, required: frozenset = REQUIRED_FIELDS) -> Optional[str]:
+    """Return why ``data`` cannot be scheduled, or None if it is valid.
+
+    A valid ``data["date"]`` is rewritten in ISO form, which is what
+    ``create_appointment`` expects.
+    """
+    if type(data) is not dict:
+        return "Request body must be a JSON object"
+    # Validate required fields
+    missing_fields = required - data.keys()
+    if missing_fields:
+        return f"Missing required fields: {', '.join(sorted(missing_fields))}"
+    # Validate services is a list and non-empty
+    if type(data["services"]) is not list or not data["services"]:
+        return "services must be a non-empty array"
+    # Reject malformed dates before tying up a browser
+    try:
+        data["date"] = parse_date(data["date"]).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return f"date must use the {_DATE_FORMATS_TEXT} format"
+    return None
+
+
+def _summary(data: dict) -> dict:
+    """Appointment fields echoed back to the client."""
+    return {
+        "client": data["client"],
+        "date": data["date"],
+        "start_time": data["start_time"],
+        "end_time": data["end_time"],
+        "branch": data["branch"],
+        "professional": data["professional"],
+        "services": data["services"],
+    }
+
+
+def _error_response(message: str, status: int = 400):
+    return jsonify({"success": False, "error": message}), status
+
+
+def _busy_response(message: str):
+    """503 response telling the client when to retry."""
+    return (
+        jsonify({"success": False, "error": message}),
+        503,
+        {"Retry-After": str(RETRY_AFTER_SECONDS)},
     )
-    # Reduce automation footprint
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option("useAutomationExtension", False)
-    # Create the driver
-    driver = webdriver.Chrome(options=options)
-    return driver
 
 
 @app.route("/health", methods=["GET"])
@@ -91,90 +643,101 @@ def create_appointment_api():
     try:
         data = request.get_json()
 
-        # Validate required fields
-        required_fields = [
-            "email",
-            "password",
-            "client",
-            "date",
-            "start_time",
-            "end_time",
-            "branch",
-            "professional",
-            "services",
-        ]
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return (
-                jsonify(
-                    {
-                        "success": False,
-                        "error": f"Missing required fields: {', '.join(missing_fields)}",
-                    }
-                ),
-                400,
-            )
-        # Validate services is a list and non-empty
-        if not isinstance(data["services"], list) or len(data["services"]) == 0:
-            return (
-                jsonify(
-                    {
-                        "success": False,
-                        "error": "services must be a non-empty array",
-                    }
-                ),
-                400,
-            )
+        error = _validation_error(data)
+        if error:
+            return _error_response(error)
 
-        driver = create_driver()
         try:
-            login_to_cashbarber(driver, data["email"], data["password"])
-            open_appointments_page(driver)
-            create_appointment(
-                driver,
-                client_name=data["client"],
-                date=data["date"],
-                start_time=data["start_time"],
-                end_time=data["end_time"],
-                branch_name=data["branch"],
-                professional_name=data["professional"],
-                services=data["services"],
-            )
-            return (
-                jsonify(
-                    {
-                        "success": True,
-                        "message": "Appointment created successfully",
-                        "data": {
-                            "client": data["client"],
-                            "date": data["date"],
-                            "start_time": data["start_time"],
-                            "end_time": data["end_time"],
-                            "branch": data["branch"],
-                            "professional": data["professional"],
-                            "services": data["services"],
-                        },
-                    }
-                ),
-                200,
-            )
-        finally:
-            driver.quit()
+            _create_once(data)
+        except _Busy as e:
+            return _busy_response(str(e))
+        except LoginError as e:
+            return _error_response(str(e), 401)
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "message": "Appointment created successfully",
+                    "data": _summary(data),
+                }
+            ),
+            200,
+        )
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(f"Error creating appointment: {error_trace}", file=sys.stderr)
+        logger.exception("Error creating appointment")
         return (
             jsonify(
                 {
                     "success": False,
                     "error": str(e),
-                    "trace": error_trace,
                 }
             ),
             500,
         )
 
 
-if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=False)
+@app.route("/create-appointments", methods=["POST"])
+def create_appointments_api():
+    """
+    Create several appointments for one account on a single logged-in browser.
+
+    Expected JSON body:
+        {
+            "email": "user@example.com",
+            "password": "password123",
+            "appointments": [
+                {
+                    "client": "Client Name",
+                    "date": "2025-10-03",
+                    "start_time": "11:40",
+                    "end_time": "11:50",
+                    "branch": "Centro",
+                    "professional": "Miguel Oliveira",
+                    "services": ["Corte de Cabelo"]
+                }
+            ],
+            "parallel": 2
+        }
+
+    ``parallel`` (optional) spreads the items over that many browsers, up to
+    MAX_BATCH_PARALLELISM.  The response has one entry per item, in request
+    order, in ``results``; ``success`` is true only if every item succeeded.
+    """
+    try:
+        data = request.get_json()
+        if type(data) is not dict:
+            return _error_response("Request body must be a JSON object")
+
+        missing_fields = {"email", "password", "appointments"} - data.keys()
+        if missing_fields:
+            return _error_response(f"Missing required fields: {', '.join(sorted(missing_fields))}")
+        appointments = data["appointments"]
+        if type(appointments) is not list or not appointments:
+            return _error_response("appointments must be a non-empty array")
+        if len(appointments) > MAX_BATCH_SIZE:
+            return _error_response(f"appointments must have at most {MAX_BATCH_SIZE} items")
+        for i, appointment in enumerate(appointments):
+            if type(appointment) is not dict:
+                return _error_response(f"appointments[{i}] must be an object")
+            error = _validation_error(appointment, APPOINTMENT_FIELDS)
+            if error:
+                return _error_response(f"appointments[{i}]: {error}")
+        parallel = data.get("parallel", BATCH_PARALLELISM)
+        if type(parallel) is not int or parallel < 1:
+            return _error_response("parallel must be a positive integer")
+
+        try:
+            results = _run_batch_parallel(
+                data["email"],
+                data["password"],
+                appointments,
+                min(parallel, MAX_BATCH_PARALLELISM),
+            )
+        except _Busy as e:
+            return _busy_response(str(e))
+        except LoginError as e:
+            return _error_response(str(e), 401)
+        return jsonify({"success": all(r["success"] for r in results), "results": results}), 200
+    except Exception as e:
+        logger.exception("Error creating appointment batch")
+        return _error_response(str(e), 500)
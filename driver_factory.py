@@ -0,0 +1,589 @@
+# Criação e encerramento dos Chrome WebDrivers usados pela API.
+#
+# A configuração do WebDriver foi ajustada para utilizar o ``new headless``
+# do Chrome e definir corretamente o idioma e locale para pt‑BR, garantindo
+# que campos de data e hora sejam interpretados corretamente em ambientes
+# sem interface gráfica【972299686105822†L34-L46】.  Todo driver criado aqui é
+# registrado para que o encerramento do processo possa finalizá-lo.
+
+import atexit
+import fcntl
+import logging
+import os
+import queue
+import shutil
+import signal
+import socket
+import threading
+import time
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+from selenium.webdriver.common.driver_finder import DriverFinder
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open to each ChromeDriver.  Selenium's keep-alive pool
+# defaults to a single connection, so concurrent commands against one driver
+# would queue and log "connection pool is full".
+DRIVER_HTTP_POOL_MAXSIZE = int(os.environ.get("DRIVER_HTTP_POOL_MAXSIZE", 20))
+
+# Every driver created by this process and not yet quit, checked out or not,
+# so shutdown can reap them all.
+_live_drivers = set()
+_live_drivers_lock = threading.Lock()
+# Driver -> PID of its local Chrome browser process, for killing just that
+# browser (the shared chromedriver's process group holds everyone's)
+_driver_chrome_pid = {}
+
+# Persistent Chrome profiles (and their HTTP disk cache) so the painel's
+# CSS/JS is not downloaded again by every new driver.  Chrome refuses to
+# share a user-data-dir, so each live driver owns a numbered slot under the
+# root; an empty CHROME_PROFILE_ROOT disables persistence.  Set
+# CHROME_FRESH_PROFILE=1 to wipe the profiles when the process starts.
+CHROME_PROFILE_ROOT = os.environ.get("CHROME_PROFILE_ROOT", "/tmp/cashbarber-profile")
+CHROME_DISK_CACHE_SIZE = int(os.environ.get("CHROME_DISK_CACHE_SIZE", 100 * 1024 * 1024))
+# Slot -> descriptor of the slot's flocked lock file, held while it is in use
+_used_profile_slots = {}
+_driver_profile_slot = {}
+# Wiped per slot on its first claim rather than all at import, which would
+# pull the profiles out from under another worker's running browsers
+CHROME_FRESH_PROFILE = os.environ.get("CHROME_FRESH_PROFILE", "").lower() in ("1", "true", "yes")
+_fresh_profile_slots = set()
+
+# URL patterns Chrome never fetches: pictures, media and third-party trackers
+# are irrelevant to filling the forms.  Fonts and SVGs stay allowed because
+# icon fonts and SVG icons/sprites inside buttons give them their size, which
+# the layout and visibility checks rely on.  Override with a comma-separated
+# list.
+BLOCKED_URL_PATTERNS = [
+    p.strip()
+    for p in os.environ.get(
+        "BLOCKED_URL_PATTERNS",
+        "*.png,*.jpg,*.jpeg,*.gif,*.webp,*.ico,*.mp4,*.webm,*.mp3,"
+        "*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*,"
+        "*facebook.net*,*hotjar.com*,*clarity.ms*,*mixpanel.com*,*segment.com*,"
+        "*segment.io*,*ingest.sentry.io*",
+    ).split(",")
+    if p.strip()
+]
+
+# URL of a long-lived Selenium server / chromedriver (e.g.
+# http://selenium:4444/wd/hub).  When set, drivers are webdriver.Remote
+# sessions on it instead of a chromedriver + Chrome launched per driver.
+SELENIUM_REMOTE_URL = os.environ.get("SELENIUM_REMOTE_URL", "")
+
+# chromedriver binary baked into the image.  With an explicit path Selenium
+# skips Selenium Manager's driver lookup (a subprocess, and possibly a
+# download) on every launch; falls back to the one on PATH.
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH") or shutil.which("chromedriver")
+
+# Run a single local chromedriver for the whole process and open each
+# session on it, instead of launching a chromedriver per driver.  Ignored
+# when SELENIUM_REMOTE_URL is set.
+SHARED_CHROMEDRIVER = os.environ.get("SHARED_CHROMEDRIVER", "1").lower() in ("1", "true", "yes")
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+# Browsers started ahead of time (see prelaunch_drivers) and not handed out yet
+DRIVER_SPARES = int(os.environ.get("DRIVER_SPARES", 1))
+_spares = queue.Queue()
+# A spare that fails to start (e.g. the Selenium server is still coming up)
+# is retried with exponential backoff, up to this many seconds apart
+DRIVER_SPARE_RETRY_MAX = float(os.environ.get("DRIVER_SPARE_RETRY_MAX", 60))
+# Set by reap_drivers so no spare is started during shutdown
+_shutting_down = threading.Event()
+
+# Upper bound (seconds) for driver.get().  A tracker that never finishes
+# must not hold a navigation for Chrome's default 300 s; the automation
+# waits for the elements it needs anyway.
+PAGE_LOAD_TIMEOUT = float(os.environ.get("PAGE_LOAD_TIMEOUT", 15))
+# Upper bound (seconds) for execute_async_script, set once per driver; the
+# async waits in schedule_cashbarber time out well before it
+SCRIPT_TIMEOUT = float(os.environ.get("SCRIPT_TIMEOUT", 30))
+
+
+def _pid_running(pid: int) -> bool:
+    """Whether ``pid`` is a live process (zombies count as gone)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The state letter follows the parenthesised command name
+            return f.read().rpartition(")")[2].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+    except (OSError, IndexError):
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _proc_pids():
+    try:
+        return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return []
+
+
+def _find_chrome_pid(driver: webdriver.Chrome):
+    """PID of the browser process behind a local ``driver`` (Linux only).
+
+    chromedriver reports the user-data-dir it started Chrome with; the
+    browser is the process with that flag and no ``--type=`` (renderers,
+    GPU and utility processes carry one).
+    """
+    user_data_dir = (driver.capabilities.get("chrome") or {}).get("userDataDir")
+    if not user_data_dir:
+        return None
+    wanted = f"--user-data-dir={user_data_dir}"
+    for pid in _proc_pids():
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                args = f.read().decode(errors="replace").split("\0")
+        except OSError:
+            continue
+        if wanted in args and not any(a.startswith("--type=") for a in args):
+            return pid
+    return None
+
+
+def _proc_stat(pid: int):
+    """``(ppid, start_time)`` of ``pid`` from /proc, or None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesised command name start at the state
+            fields = f.read().rpartition(")")[2].split()
+        return int(fields[1]), int(fields[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _same_process(pid: int, start_time: int) -> bool:
+    stat = _proc_stat(pid)
+    return stat is not None and stat[1] == start_time
+
+
+def _process_tree(pid: int):
+    """``{pid: start_time}`` for ``pid`` and all of its descendants.
+
+    The start time tells a process apart from a later one that reuses its PID.
+    """
+    stats = {p: stat for p in _proc_pids() if (stat := _proc_stat(p)) is not None}
+    children = {}
+    for child, (ppid, _) in stats.items():
+        children.setdefault(ppid, []).append(child)
+    tree, pending = {}, [pid]
+    while pending:
+        current = pending.pop()
+        if current in stats:
+            tree[current] = stats[current][1]
+            pending.extend(children.get(current, ()))
+    return tree
+
+
+def _kill_chrome(pid: int, tree, timeout: float = 5) -> bool:
+    """SIGKILL what is left of a browser's process ``tree``; True once ``pid`` is gone."""
+    for member, start_time in tree.items():
+        if _same_process(member, start_time):
+            try:
+                os.kill(member, signal.SIGKILL)
+            except OSError:
+                pass
+    deadline = time.monotonic() + timeout
+    while pid in tree and _same_process(pid, tree[pid]) and _pid_running(pid):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _profile_in_use(profile_dir: str) -> bool:
+    """Whether a running Chrome still holds ``profile_dir``.
+
+    Chrome's SingletonLock is a symlink to ``<hostname>-<pid>``; a lock whose
+    process is gone (or that names another host) is stale.
+    """
+    try:
+        target = os.readlink(os.path.join(profile_dir, "SingletonLock"))
+    except OSError:
+        return False
+    host, _, pid = target.rpartition("-")
+    return host == socket.gethostname() and pid.isdigit() and _pid_running(int(pid))
+
+
+def _lock_profile_slot(slot: int):
+    """Flock ``slot``'s directory if no other process or live Chrome uses it.
+
+    Returns the locked descriptor, or None when the slot is taken.
+    """
+    base = os.path.join(CHROME_PROFILE_ROOT, str(slot))
+    os.makedirs(os.path.join(base, "profile"), mode=0o700, exist_ok=True)
+    fd = os.open(os.path.join(base, "slot.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        # Another worker process owns this slot
+        os.close(fd)
+        return None
+    if _profile_in_use(os.path.join(base, "profile")):
+        # A Chrome that outlived its worker (e.g. killed by a Gunicorn
+        # timeout) still runs on this profile; closing drops the flock
+        os.close(fd)
+        return None
+    if CHROME_FRESH_PROFILE and slot not in _fresh_profile_slots:
+        _fresh_profile_slots.add(slot)
+        for name in ("profile", "cache"):
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+        os.makedirs(os.path.join(base, "profile"), mode=0o700, exist_ok=True)
+    return fd
+
+
+def _claim_profile_slot() -> int:
+    """Reserve the lowest profile slot not used by a live driver.
+
+    CHROME_PROFILE_ROOT is shared by every process on the host, so besides
+    this process' own slots, a slot is skipped while another process holds its
+    flock or a running Chrome holds its profile.
+    """
+    with _live_drivers_lock:
+        slot = 0
+        while True:
+            if slot not in _used_profile_slots:
+                fd = _lock_profile_slot(slot)
+                if fd is not None:
+                    _used_profile_slots[slot] = fd
+                    return slot
+            slot += 1
+
+
+def _release_profile_slot(slot: int) -> None:
+    with _live_drivers_lock:
+        fd = _used_profile_slots.pop(slot, None)
+    if fd is not None:
+        os.close(fd)
+
+
+def _add_profile_arguments(options: Options, slot: int) -> None:
+    base = os.path.join(CHROME_PROFILE_ROOT, str(slot))
+    profile_dir = os.path.join(base, "profile")
+    # No live Chrome holds a claimed slot (see _lock_profile_slot), so lock
+    # files left here are from a Chrome that was killed and would block it
+    for name in ("SingletonLock", "SingletonSocket", "SingletonCookie"):
+        try:
+            os.unlink(os.path.join(profile_dir, name))
+        except OSError:
+            pass
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    options.add_argument(f"--disk-cache-dir={os.path.join(base, 'cache')}")
+    options.add_argument(f"--disk-cache-size={CHROME_DISK_CACHE_SIZE}")
+
+
+def _launch_driver() -> webdriver.Chrome:
+    """Create a Chrome WebDriver instance with proper options for server environment.
+
+    The driver is configured to run in headless mode using Chrome's *new* headless
+    implementation.  This ensures that language arguments such as ``--lang=pt-BR``
+    are respected【972299686105822†L34-L46】.  It also sets the user agent and
+    disables automation flags to reduce detection by the target site.
+
+    Returns:
+        webdriver.Chrome: A configured Chrome WebDriver instance.
+    """
+    options = Options()
+    # Define a realistic user‑agent to avoid basic bot detection
+    options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36"
+    )
+    # Use Chrome's new headless mode so that --lang is honoured
+    options.add_argument("--headless=new")
+    # Other recommended flags for headless environments
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    # Force the browser to use the Brazilian Portuguese locale
+    options.add_argument("--lang=pt-BR")
+    # Skip downloading images and deny notification/geolocation/camera
+    # prompts; stylesheets stay enabled because element visibility checks
+    # depend on the layout
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument("--disable-extensions")
+    # AcceptCHFrame: no extra navigation restart to send client hints
+    options.add_argument(
+        "--disable-features=Translate,MediaRouter,BackForwardCache,OptimizationHints,AcceptCHFrame"
+    )
+    # Skip first-run work and background services (sync, default apps,
+    # component updates) that pooled automation browsers never use, even
+    # though they are long-lived and keep a persistent profile
+    options.add_argument("--no-first-run")
+    options.add_argument("--no-default-browser-check")
+    options.add_argument("--disable-default-apps")
+    options.add_argument("--disable-sync")
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--metrics-recording-only")
+    options.add_argument("--mute-audio")
+    # Keep timers and rendering at full speed even though no window is focused
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-renderer-backgrounding")
+    options.add_experimental_option(
+        "prefs",
+        {
+            "intl.accept_languages": "pt-BR,pt,en-US,en",
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.default_content_setting_values.geolocation": 2,
+            "profile.default_content_setting_values.media_stream": 2,
+        },
+    )
+    # Return from driver.get() at DOMContentLoaded; the automation already
+    # waits explicitly for the elements it needs
+    options.page_load_strategy = "eager"
+    # Reduce automation footprint; without chromedriver's default
+    # --enable-logging Chrome stops writing its verbose log to stderr
+    options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
+    options.add_experimental_option("useAutomationExtension", False)
+    if SELENIUM_REMOTE_URL:
+        # Browser launched by the already running remote server; profile
+        # paths would refer to its filesystem, so none are set
+        return _register(_remote_driver(SELENIUM_REMOTE_URL, options), None)
+    slot = None
+    if CHROME_PROFILE_ROOT:
+        slot = _claim_profile_slot()
+        _add_profile_arguments(options, slot)
+    try:
+        if SHARED_CHROMEDRIVER:
+            driver = _remote_driver(_shared_service_url(options), options)
+        else:
+            # Start chromedriver in its own session so it and the Chrome
+            # processes it spawns share a process group that can be killed
+            # as a whole on shutdown
+            service = Service(executable_path=CHROMEDRIVER_PATH, popen_kw={"start_new_session": True})
+            # keep_alive makes every command reuse the same connections to
+            # chromedriver instead of opening one per command
+            driver = webdriver.Chrome(service=service, options=options, keep_alive=True)
+    except Exception:
+        if slot is not None:
+            _release_profile_slot(slot)
+        raise
+    return _register(driver, slot, _find_chrome_pid(driver))
+
+
+def _remote_driver(url: str, options: Options) -> webdriver.Remote:
+    """Open a session on the chromedriver / Selenium server at ``url``."""
+    # A Chromium connection registers the goog/cdp command used by
+    # _block_requests, which the generic RemoteConnection lacks; keep_alive
+    # reuses connections across commands
+    executor = ChromiumRemoteConnection(url, vendor_prefix="goog", browser_name="chrome", keep_alive=True)
+    return webdriver.Remote(command_executor=executor, options=options)
+
+
+def _shared_service_url(options: Options) -> str:
+    """Start the shared chromedriver on first use (or after it died) and return its URL."""
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None or _shared_service.process.poll() is not None:
+            # Own process group, as for per-driver services, so shutdown can
+            # kill chromedriver and every Chrome it started at once
+            service = Service(executable_path=CHROMEDRIVER_PATH, popen_kw={"start_new_session": True})
+            service.path = DriverFinder.get_path(service, options)
+            service.start()
+            _shared_service = service
+        return _shared_service.service_url
+
+
+def _register(driver: webdriver.Chrome, slot, chrome_pid=None) -> webdriver.Chrome:
+    """Track a freshly started driver for shutdown and finish setting it up.
+
+    Tracking comes first so that a setup failure quits the browser, kills it
+    if need be and frees its profile slot like any other driver.
+    """
+    with _live_drivers_lock:
+        _live_drivers.add(driver)
+        if slot is not None:
+            _driver_profile_slot[driver] = slot
+        if chrome_pid is not None:
+            _driver_chrome_pid[driver] = chrome_pid
+    try:
+        _widen_command_pool(driver)
+        # Only explicit WebDriverWaits: a missing element must fail at once
+        driver.implicitly_wait(0)
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        driver.set_script_timeout(SCRIPT_TIMEOUT)
+        _block_requests(driver)
+    except Exception:
+        quit_driver(driver)
+        raise
+    return driver
+
+
+def _launch_spare() -> None:
+    """Start one spare, retrying until it is up or the process shuts down."""
+    delay = 1.0
+    while not _shutting_down.is_set():
+        try:
+            driver = _launch_driver()
+        except Exception:
+            logger.warning("Could not pre-launch a Chrome driver; retrying in %.0f s", delay, exc_info=True)
+            if _shutting_down.wait(delay):
+                return
+            delay = min(delay * 2, DRIVER_SPARE_RETRY_MAX)
+            continue
+        if _shutting_down.is_set():
+            quit_driver(driver)
+        else:
+            _spares.put(driver)
+        return
+
+
+def prelaunch_drivers() -> None:
+    """Start DRIVER_SPARES browsers in the background for later create_driver calls."""
+    for _ in range(DRIVER_SPARES):
+        threading.Thread(target=_launch_spare, daemon=True).start()
+
+
+def create_driver() -> webdriver.Chrome:
+    """Return a new Chrome WebDriver, taking a pre-launched one when available.
+
+    Each spare handed out is replaced in the background, so the caller only
+    pays Chrome's cold start when the spares have run out.
+    """
+    while DRIVER_SPARES > 0:
+        try:
+            driver = _spares.get_nowait()
+        except queue.Empty:
+            break
+        threading.Thread(target=_launch_spare, daemon=True).start()
+        try:
+            driver.execute_script("return 1")
+            return driver
+        except Exception:
+            # The spare died while idle
+            quit_driver(driver)
+    return _launch_driver()
+
+
+def _widen_command_pool(driver: webdriver.Chrome) -> None:
+    """Let the driver's urllib3 PoolManager keep more than one connection.
+
+    Selenium 4.15 exposes no option for this, so the pool keyword arguments
+    are patched on the live manager; ``clear()`` drops the pool created during
+    session start-up so the next command builds one with the new size.
+    """
+    conn = getattr(driver.command_executor, "_conn", None)
+    if conn is None:
+        # Without keep-alive Selenium builds a new PoolManager per command
+        logger.warning("ChromeDriver connection is not kept alive; commands open new connections")
+        return
+    conn.connection_pool_kw["maxsize"] = DRIVER_HTTP_POOL_MAXSIZE
+    conn.clear()
+
+
+def _block_requests(driver: webdriver.Chrome) -> None:
+    """Have Chrome drop requests matching BLOCKED_URL_PATTERNS (via CDP)."""
+    if not BLOCKED_URL_PATTERNS:
+        return
+    try:
+        # Goes through the command executor so it also works on webdriver.Remote
+        driver.execute("executeCdpCommand", {"cmd": "Network.enable", "params": {}})
+        driver.execute(
+            "executeCdpCommand",
+            {"cmd": "Network.setBlockedURLs", "params": {"urls": BLOCKED_URL_PATTERNS}},
+        )
+    except Exception:
+        logger.warning("Could not set blocked URLs on the driver", exc_info=True)
+
+
+def _kill_process_group(driver: webdriver.Chrome) -> bool:
+    """SIGKILL whatever is left of the driver's own chromedriver/Chrome process group.
+
+    Returns False when there is no such group: remote drivers, including
+    those on the shared chromedriver, have no service of their own.
+    """
+    return _kill_service_group(getattr(driver, "service", None))
+
+
+def _kill_service_group(service) -> bool:
+    process = getattr(service, "process", None)
+    if process is None:
+        return False
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    return True
+
+
+def quit_driver(driver: webdriver.Chrome) -> None:
+    with _live_drivers_lock:
+        _live_drivers.discard(driver)
+        chrome_pid = _driver_chrome_pid.pop(driver, None)
+        slot = _driver_profile_slot.pop(driver, None)
+    # Taken before quitting: renderers orphaned by quit() are no longer
+    # descendants of the browser afterwards
+    chrome_tree = _process_tree(chrome_pid) if chrome_pid is not None else None
+    try:
+        driver.quit()
+        quit_ok = True
+    except Exception:
+        quit_ok = False
+    # A chromedriver of its own goes down with its whole process group,
+    # browser included
+    own_group_killed = _kill_process_group(driver)
+    if chrome_tree is not None:
+        # On the shared chromedriver that group holds every driver's
+        # browser, so this one is killed by PID, renderers included
+        chrome_gone = _kill_chrome(chrome_pid, chrome_tree)
+    else:
+        chrome_gone = quit_ok or own_group_killed
+    if slot is None:
+        return
+    if chrome_gone:
+        # Nothing runs on the profile any more; the next Chrome may take it
+        _release_profile_slot(slot)
+    else:
+        # Handing the profile to a new Chrome while this one may still hold
+        # it would put two browsers on one user-data-dir
+        logger.warning("Chrome on profile slot %d may still be running; keeping the slot reserved", slot)
+
+
+def reap_drivers() -> None:
+    """Quit every live driver, giving each a few seconds before killing it."""
+    _shutting_down.set()
+    with _live_drivers_lock:
+        drivers = list(_live_drivers)
+    quitters = [threading.Thread(target=quit_driver, args=(d,), daemon=True) for d in drivers]
+    for thread in quitters:
+        thread.start()
+    for thread in quitters:
+        thread.join(timeout=5)
+    for driver in drivers:
+        _kill_process_group(driver)
+    _kill_service_group(_shared_service)
+
+
+def install_shutdown_hooks() -> None:
+    """Reap drivers at interpreter exit and on SIGTERM.
+
+    The previous SIGTERM handler (e.g. Gunicorn's graceful shutdown) is kept
+    and called after the drivers are gone.
+    """
+    atexit.register(reap_drivers)
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def _on_sigterm(signum, frame):
+        reap_drivers()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, _on_sigterm)
@@ -12,8 +12,15 @@ Melhorias-chave:
 """
 
 import argparse
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import os
 import sys
-from typing import List
+import threading
+from typing import List, Optional
 import time
 from datetime import datetime
 
@@ -26,13 +33,143 @@ from selenium.webdriver.common.keys import Keys
 from selenium.common.exceptions import (
     TimeoutException,
     NoSuchElementException,
-    ElementNotInteractableException,
     StaleElementReferenceException,
 )
 
 
+# ========================= Localizadores =========================
+# Definidos uma vez no import; ajuste aqui quando a UI do painel mudar.
+# CSS sempre que possível; XPath só onde é preciso casar texto.
+
+BASE_URL = "https://painel.cashbarber.com.br/"
+LOGIN_URL = "https://painel.cashbarber.com.br/auth/login"
+EMAIL_INPUT_LOCATOR = (By.CSS_SELECTOR, 'input[placeholder="Informe o seu e-mail"]')
+PASSWORD_INPUT_LOCATOR = (By.CSS_SELECTOR, 'input[placeholder="Informe sua senha"]')
+LOGIN_BUTTON_LOCATOR = (By.XPATH, '//button[contains(normalize-space(), "Acessar")]')
+# Mensagens com que o painel recusa um login (credenciais inválidas etc.)
+LOGIN_ERROR_CSS = (
+    '[class*="alert-danger"], [class*="invalid-feedback"], [class*="toast-error"], '
+    '[class*="swal2-popup"]:has([class*="swal2-icon-error"])'
+)
+MODAL_LOCATOR = (
+    By.CSS_SELECTOR,
+    'div[class*="modal-agendamento"], div[role="dialog"], div[class*="modal"]',
+)
+# SweetAlert, toasts e alerts; a string CSS também alimenta o MutationObserver
+# de `watch_popups` e a varredura de `capture_popup_content`
+POPUP_CSS = '[class*="swal2-container"], [class*="toast"], [class*="alert"], [role="alertdialog"], [role="alert"]'
+POPUP_LOCATOR = (By.CSS_SELECTOR, POPUP_CSS)
+SWAL_LOCATOR = (By.CSS_SELECTOR, '[class*="swal2-container"]')
+SWAL_CONFIRM_LOCATOR = (By.CSS_SELECTOR, 'button[class*="swal2-confirm"]')
+
+logger = logging.getLogger(__name__)
+
+# Logs de diagnóstico (uma chamada ao navegador cada) só em nível DEBUG;
+# CASHBARBER_DEBUG=1 liga esse nível para este módulo
+DEBUG = os.environ.get("CASHBARBER_DEBUG", "").lower() in ("1", "true", "yes")
+if DEBUG:
+    logger.setLevel(logging.DEBUG)
+
+# Intervalo (s) entre consultas das esperas explícitas; cada consulta é uma
+# ida e volta ao WebDriver.  CASHBARBER_POLL=0.05 em painel local/CI.
+POLL_FREQUENCY = float(os.environ.get("CASHBARBER_POLL", 0.1))
+
+
 # ========================= Helpers Gerais =========================
 
+# Formatos aceitos para a data do agendamento
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d%m%Y")
+
+
+def _date_format(value: str) -> Optional[str]:
+    """Deduz o formato pelo separador e pela posição do ano (sem tentativa e erro).
+
+    Devolve None se o formato deduzido não estiver em DATE_FORMATS.
+    """
+    sep = "/" if "/" in value else "-" if "-" in value else ""
+    if not sep:
+        fmt = "%d%m%Y"
+    else:
+        fmt = f"%Y{sep}%m{sep}%d" if value.index(sep) == 4 else f"%d{sep}%m{sep}%Y"
+    return fmt if fmt in DATE_FORMATS else None
+
+
+def parse_date(value: str) -> datetime:
+    """Converte a data do agendamento (um dos DATE_FORMATS) em datetime.
+
+    O formato ISO, o mais comum, é montado direto pelo construtor; os demais
+    vão ao strptime uma única vez, no formato que o texto indica. Levanta
+    ValueError se a data não estiver em nenhum dos DATE_FORMATS e TypeError se
+    não for texto.
+    """
+    if not isinstance(value, str):
+        raise TypeError(f"Data deve ser texto: {value!r}")
+    if len(value) == 10 and value[4] == "-" and value[7] == "-":
+        year, month, day = value[:4], value[5:7], value[8:]
+        if (year + month + day).isdigit():
+            return datetime(int(year), int(month), int(day))
+    fmt = _date_format(value)
+    if fmt is not None:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"Data inválida: {value!r}")
+
+
+def navigate(driver, url: str) -> None:
+    """Abre `url` sem depender do fim do carregamento.
+
+    Se o page-load timeout do driver estourar (recurso de terceiros travado),
+    segue com a página parcial: quem chama espera pelos elementos de que
+    precisa.
+    """
+    try:
+        driver.get(url)
+    except TimeoutException:
+        logger.info("ℹ️ Carregamento de %s excedeu o limite; seguindo com a página parcial.", url)
+
+
+def fast_wait(driver, timeout=15):
+    """WebDriverWait que consulta a cada POLL_FREQUENCY (100 ms; o padrão é 500 ms).
+
+    Ignora elementos obsoletos/ausentes durante a espera, tratando-os como
+    "ainda não pronto".
+    """
+    return WebDriverWait(
+        driver,
+        timeout,
+        poll_frequency=POLL_FREQUENCY,
+        ignored_exceptions=(StaleElementReferenceException, NoSuchElementException),
+    )
+
+
+def _tick(delay: float) -> None:
+    """Pausa opcional entre passos, para acompanhar o navegador ao depurar (0 = nenhuma)."""
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _retry_on_stale(attempts: int = 3):
+    """Reexecuta a função decorada se o DOM re-renderizar no meio dela.
+
+    A função precisa localizar os próprios elementos a cada chamada e ser
+    idempotente; a última StaleElementReferenceException é propagada.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return fn(*args, **kwargs)
+                except StaleElementReferenceException:
+                    if attempt == attempts - 1:
+                        raise
+                    logger.info("ℹ️ Elemento obsoleto em %s; localizando de novo.", fn.__name__)
+        return wrapper
+    return decorator
+
+
 def _wait_until_value(driver, element, expected_values, timeout=10):
     """Espera até o elemento ter um dos valores esperados."""
     if isinstance(expected_values, str):
@@ -45,7 +182,7 @@ def _wait_until_value(driver, element, expected_values, timeout=10):
         except Exception:
             return False
 
-    WebDriverWait(driver, timeout).until(_ok)
+    fast_wait(driver, timeout).until(_ok)
 
 
 def _clear(element):
@@ -54,15 +191,71 @@ def _clear(element):
     element.send_keys(Keys.DELETE)
 
 
+# Foca cada input, define o valor e dispara os eventos esperados por
+# frameworks (React/Vue/etc.) e bibliotecas de máscara (keydown/keyup).
+# Usa o setter nativo de HTMLInputElement: o React intercepta `el.value = ...`
+# e descartaria a mudança no próximo render.
+_SET_VALUES_JS = """
+    const nativeSetter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+    for (const [el, value] of arguments[0]) {
+        el.focus();
+        el.dispatchEvent(new KeyboardEvent('keydown', { bubbles: true }));
+        if (el instanceof HTMLInputElement) {
+            nativeSetter.call(el, value);
+        } else {
+            el.value = value;
+        }
+        el.dispatchEvent(new Event('input', { bubbles: true }));
+        el.dispatchEvent(new KeyboardEvent('keyup', { bubbles: true }));
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+        el.dispatchEvent(new Event('blur', { bubbles: true }));
+    }
+"""
+
+
 def _set_with_js(driver, element, value):
     """Define valor via JS e dispara eventos para frameworks (React/Vue/etc.)."""
-    js = """
-        arguments[0].value = arguments[1];
-        arguments[0].dispatchEvent(new Event('input', { bubbles: true }));
-        arguments[0].dispatchEvent(new Event('change', { bubbles: true }));
-        arguments[0].dispatchEvent(new Event('blur', { bubbles: true }));
+    driver.execute_script(_SET_VALUES_JS, [[element, value]])
+
+
+def _set_many_with_js(driver, pairs):
+    """Como `_set_with_js`, mas para vários (elemento, valor) num único comando."""
+    driver.execute_script(_SET_VALUES_JS, [[el, value] for el, value in pairs])
+
+
+def _pending_values(driver, checks, timeout=2):
+    """Espera vários campos terem os valores esperados, lendo todos numa só chamada JS por tentativa.
+
+    `checks` é uma lista de (elemento, valores esperados); retorna os índices
+    dos campos que ainda divergem ao fim do `timeout`.
     """
-    driver.execute_script(js, element, value)
+    elements = [el for el, _ in checks]
+    expected = [[v] if isinstance(v, str) else list(v) for _, v in checks]
+    pending = list(range(len(checks)))
+
+    def _ok(_):
+        try:
+            values = driver.execute_script("return arguments[0].map(e => e.value);", elements)
+        except Exception:
+            return False
+        pending[:] = [i for i, v in enumerate(values) if (v or "") not in expected[i]]
+        return not pending
+
+    try:
+        fast_wait(driver, timeout).until(_ok)
+    except TimeoutException:
+        pass
+    return pending
+
+
+def _type_value(driver, element, typed, expected_values, timeout):
+    """Digita `typed` num único send_keys (para máscaras que rejeitam o valor via JS) e confirma."""
+    if logger.isEnabledFor(logging.DEBUG):
+        # get_attribute é uma ida ao WebDriver; só vale a pena se for logado
+        logger.debug("Valor via JS não aceito em '%s'; digitando.", element.get_attribute("name"))
+    _clear(element)
+    element.send_keys(typed, Keys.TAB)
+    _wait_until_value(driver, element, expected_values, timeout=timeout)
 
 
 def _first_visible_by_name(driver, name):
@@ -81,8 +274,46 @@ def _first_visible_by_name(driver, name):
     return driver.find_element(By.NAME, name)
 
 
+def _find_fields(driver, names):
+    """Localiza vários inputs (primeiro visível por name) e lê seus tipos numa só chamada JS.
+
+    Retorna {name: (elemento, tipo)}; campos não resolvidos pelo script caem
+    no `_first_visible_by_name`.
+    """
+    try:
+        found = driver.execute_script("""
+            const out = {};
+            for (const name of arguments[0]) {
+                const els = Array.from(document.getElementsByName(name));
+                const el = els.find(e => !!(e.offsetParent) && e.getBoundingClientRect().width > 0 && e.getBoundingClientRect().height > 0) || els[0] || null;
+                out[name] = el ? { el: el, type: (el.type || '').toLowerCase() } : null;
+            }
+            return out;
+        """, list(names)) or {}
+    except Exception:
+        found = {}
+    fields = {}
+    for name in names:
+        info = found.get(name)
+        if info:
+            fields[name] = (info["el"], info["type"])
+        else:
+            el = _first_visible_by_name(driver, name)
+            fields[name] = (el, (el.get_attribute("type") or "").lower())
+    return fields
+
+
 def log_datetime_fields(driver, step_name: str):
-    """Loga valores dos campos de data/hora (considera múltiplos inputs)."""
+    """Loga valores dos campos de data/hora (considera múltiplos inputs).
+
+    Fora do nível DEBUG não faz nada, evitando a ida e volta ao WebDriver; com
+    a sessão já encerrada também não tenta o script fadado a falhar.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if getattr(driver, "session_id", None) is None:
+        logger.debug("LOG [%s] Sessão do WebDriver encerrada; campos não lidos.", step_name)
+        return
     try:
         vals = driver.execute_script("""
             const out = {};
@@ -92,84 +323,203 @@ def log_datetime_fields(driver, step_name: str):
             out.end   = Array.from(document.getElementsByName('age_fim')).map(e => e.value);
             return out;
         """)
-        print(f"\n--- LOG [{step_name}] ---")
-        print(f"    type(age_data): {vals.get('type_date')}")
-        print(f"    age_data      : {vals.get('date')}")
-        print(f"    age_inicio    : {vals.get('start')}")
-        print(f"    age_fim       : {vals.get('end')}")
-        print("----------------------------------\n")
+        logger.debug(
+            "LOG [%s]\n    type(age_data): %s\n    age_data      : %s\n    age_inicio    : %s\n    age_fim       : %s",
+            step_name, vals.get("type_date"), vals.get("date"), vals.get("start"), vals.get("end"),
+        )
     except Exception as e:
-        print(f"\n--- LOG [{step_name}] ---")
-        print(f"    Falha lendo campos: {e}")
-        print("----------------------------------\n")
+        logger.debug("LOG [%s] Falha lendo campos: %s", step_name, e)
+
+
+# Registra (uma vez por página) um MutationObserver que guarda em
+# window.__cbPopups todo popup inserido no DOM, inclusive toasts que somem
+# antes da próxima consulta do Python. Cada chamada esvazia a fila.
+_WATCH_POPUPS_JS = """
+    const css = arguments[0];
+    window.__cbPopups = [];
+    if (window.__cbPopupObserver) return;
+    window.__cbPopupObserver = new MutationObserver(muts => {
+        for (const m of muts) for (const n of m.addedNodes) {
+            if (n.nodeType !== 1) continue;
+            if (n.matches(css)) window.__cbPopups.push(n);
+            for (const el of n.querySelectorAll(css)) window.__cbPopups.push(el);
+        }
+    });
+    window.__cbPopupObserver.observe(document.documentElement, { childList: true, subtree: true });
+"""
+
+# Próximo popup com texto: primeiro os registrados pelo observer (aceitos
+# mesmo se já removidos do DOM), depois o primeiro nó visível do seletor;
+# filtra no navegador para não gastar um is_displayed()/text por candidato.
+_NEXT_POPUP_JS = """
+    const visible = el => {
+        const style = getComputedStyle(el);
+        return style.display !== 'none' && style.visibility !== 'hidden' && el.getClientRects().length > 0;
+    };
+    const seen = window.__cbPopups || [];
+    for (let i = 0; i < seen.length; i++) {
+        const el = seen[i];
+        const text = (el.innerText || el.textContent || '').trim();
+        if (el.isConnected && !visible(el)) continue;
+        if (text) {
+            seen.splice(i, 1);
+            return { text: text, tag: el.tagName };
+        }
+        if (!el.isConnected) seen.splice(i--, 1);
+    }
+    for (const el of document.querySelectorAll(arguments[0])) {
+        if (!visible(el)) continue;
+        const text = (el.innerText || '').trim();
+        if (text) return { text: text, tag: el.tagName };
+    }
+    return null;
+"""
+
+
+def watch_popups(driver: webdriver.Chrome) -> None:
+    """Passa a registrar popups da página atual (chame após cada navegação).
+
+    Toasts que aparecem e somem entre duas consultas ainda são vistos por
+    `capture_popup_content`.
+    """
+    try:
+        driver.execute_script(_WATCH_POPUPS_JS, POPUP_CSS)
+    except Exception as e:
+        logger.warning("ℹ️ Observador de pop-ups não instalado: %s", e)
 
 
 def capture_popup_content(driver: webdriver.Chrome, timeout: int = 8) -> dict:
     """Captura texto de popups (SweetAlert/alert/toast)."""
-    wait = WebDriverWait(driver, timeout)
+    wait = fast_wait(driver, timeout)
     try:
-        popup_element = wait.until(EC.visibility_of_element_located((
-            By.XPATH,
-            "//*[contains(@class,'swal2-container') or contains(@class,'toast') or contains(@class,'alert') or @role='alertdialog' or @role='alert']"
-        )))
-        text = popup_element.text.strip()
-        print(f"[CAPTURE] Pop-up detectado: '{text}'")
+        popup = wait.until(lambda d: d.execute_script(_NEXT_POPUP_JS, POPUP_CSS))
+        text = popup["text"]
+        logger.info("[CAPTURE] Pop-up detectado: '%s'", text)
         return {"found": True, "text": text}
     except TimeoutException:
-        print("[CAPTURE] Nenhum pop-up detectado.")
+        logger.debug("[CAPTURE] Nenhum pop-up detectado.")
         return {"found": False, "text": ""}
 
 
+# Container do SweetAlert se estiver visível agora, senão null
+_OPEN_SWAL_JS = """
+    const el = document.querySelector(arguments[0]);
+    return el && el.getClientRects().length && getComputedStyle(el).visibility !== 'hidden' ? el : null;
+"""
+
+
+# Resolve assim que o SweetAlert some (removido ou oculto), via
+# MutationObserver, ou com false após arguments[1] ms.
+_SWAL_CLOSED_JS = """
+    const el = arguments[0], ms = arguments[1], done = arguments[arguments.length - 1];
+    const gone = () => !el.isConnected || !el.getClientRects().length
+        || getComputedStyle(el).visibility === 'hidden';
+    if (gone()) return done(true);
+    const obs = new MutationObserver(() => {
+        if (gone()) { obs.disconnect(); clearTimeout(timer); done(true); }
+    });
+    const timer = setTimeout(() => { obs.disconnect(); done(false); }, ms);
+    obs.observe(document.documentElement, {
+        childList: true, subtree: true, attributes: true, attributeFilter: ['class', 'style'],
+    });
+"""
+
+
+def _wait_swal_closed(driver, swal_container, timeout) -> bool:
+    """Uma única chamada que retorna no instante em que o SweetAlert fecha.
+
+    `timeout` precisa ficar abaixo do script timeout do driver (30 s, fixado
+    em `driver_factory`), para o timer do próprio script vencer antes.
+    """
+    return bool(driver.execute_async_script(_SWAL_CLOSED_JS, swal_container, int(timeout * 1000)))
+
+
 def handle_sweetalert_popup(driver: webdriver.Chrome, timeout: int = 3):
-    """Se houver um SweetAlert aberto, tenta clicar em 'OK' e fechar."""
+    """Se houver um SweetAlert aberto, tenta clicar em 'OK' e fechar.
+
+    A checagem é imediata (uma chamada JS): sem SweetAlert não espera nada;
+    `timeout` vale só para o fechamento.
+    """
     try:
-        wait = WebDriverWait(driver, timeout)
-        swal_container = wait.until(EC.visibility_of_element_located((
-            By.XPATH, "//*[contains(@class, 'swal2-container')]"
-        )))
-        print("    [Popup Handler] SweetAlert detectado.")
-        try:
-            confirm_button = swal_container.find_element(By.XPATH, ".//button[contains(@class, 'swal2-confirm')]")
-            print("    [Popup Handler] Clicando 'OK'.")
-            confirm_button.click()
-            wait.until(EC.invisibility_of_element(swal_container))
-            print("    [Popup Handler] Pop-up fechado.")
-        except (NoSuchElementException, TimeoutException):
-            print("    [Popup Handler] Não foi possível fechar o SweetAlert.")
-    except TimeoutException:
+        swal_container = driver.execute_script(_OPEN_SWAL_JS, SWAL_LOCATOR[1])
+    except Exception:
+        swal_container = None
+    if not swal_container:
         # silencioso
-        pass
+        return
+    logger.debug("[Popup Handler] SweetAlert detectado.")
+    try:
+        confirm_button = swal_container.find_element(*SWAL_CONFIRM_LOCATOR)
+        logger.debug("[Popup Handler] Clicando 'OK'.")
+        confirm_button.click()
+        if not _wait_swal_closed(driver, swal_container, timeout):
+            raise TimeoutException("SweetAlert continua aberto")
+        logger.debug("[Popup Handler] Pop-up fechado.")
+    except (NoSuchElementException, TimeoutException, StaleElementReferenceException):
+        logger.warning("[Popup Handler] Não foi possível fechar o SweetAlert.")
+
+
+# Procura, dentro do modal, um <select> com a opção desejada (define o valor e
+# dispara change) ou um componente visível com o texto e clica nele.
+_SET_TIPO_JS = """
+    const modal = arguments[0], desired = arguments[1];
+    const want = desired.trim().toLowerCase();
+    for (const sel of modal.querySelectorAll('select')) {
+        for (const opt of sel.options) {
+            if (opt.text.trim().toLowerCase() === want) {
+                sel.value = opt.value;
+                sel.dispatchEvent(new Event('input', { bubbles: true }));
+                sel.dispatchEvent(new Event('change', { bubbles: true }));
+                return 'select';
+            }
+        }
+    }
+    for (const el of modal.querySelectorAll('label, span, div, button, a, li')) {
+        if (!(el.textContent || '').replace(/\\s+/g, ' ').includes(desired)) continue;
+        const r = el.getBoundingClientRect();
+        if (!el.offsetParent || r.width === 0 || r.height === 0 || el.disabled) continue;
+        el.click();
+        return 'custom';
+    }
+    return null;
+"""
 
 
-def try_set_tipo_agendamento(driver, desired: str = "Agendamento", timeout: int = 6, delay: float = 0.0) -> None:
-    """Tenta definir o 'Tipo' para 'Agendamento' em diferentes UIs (select, radios, custom).
-       Se não encontrar, assume que o padrão já é 'Agendamento' e segue sem erro.
-    """
-    wait = WebDriverWait(driver, timeout)
+_XPATH_UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZÁÀÂÃÉÊÍÓÔÕÚÇ"
+_XPATH_LOWER = "abcdefghijklmnopqrstuvwxyzáàâãéêíóôõúç"
+
+
+def _xpath_literal(text: str) -> str:
+    """Literal XPath 1.0 para `text`, mesmo contendo aspas simples e duplas."""
+    if "'" not in text:
+        return f"'{text}'"
+    if '"' not in text:
+        return f'"{text}"'
+    parts = text.split("'")
+    return "concat(" + ", \"'\", ".join(f"'{p}'" for p in parts) + ")"
 
-    # Escopo: o modal do agendamento
-    modal = wait.until(
-        EC.presence_of_element_located((
-            By.XPATH,
-            '//div[contains(@class,"modal-agendamento") or @role="dialog" or contains(@class,"modal")]'
-        ))
-    )
 
-    # 1) Qualquer <select> no modal cujo options contenham 'Agendamento'
+def _set_tipo_by_elements(modal, desired: str):
+    """Fallback do `_SET_TIPO_JS` usando WebElements."""
+    want = desired.strip().lower()
+    # 1) Um único XPath acha a <option> (sem diferenciar maiúsculas) em
+    #    qualquer <select> do modal, sem ler o texto de cada opção
     try:
-        selects = modal.find_elements(By.TAG_NAME, "select")
-        for sel in selects:
+        matches = modal.find_elements(
+            By.XPATH,
+            f".//select/option[translate(normalize-space(.), '{_XPATH_UPPER}', '{_XPATH_LOWER}')"
+            f" = {_xpath_literal(want)}]",
+        )
+        for opt in matches:
             try:
-                options = sel.find_elements(By.TAG_NAME, "option")
-                for opt in options:
-                    if opt.text.strip().lower() == desired.lower():
-                        sel.click()
-                        opt.click()
-                        if delay > 0: time.sleep(delay)
-                        print("✓ Tipo de agendamento selecionado via <select>.")
-                        return
+                opt.find_element(By.XPATH, "./ancestor::select[1]").click()
+                opt.click()
+                return "select"
             except StaleElementReferenceException:
                 continue
+    except StaleElementReferenceException:
+        # O modal re-renderizou: quem chama localiza de novo
+        raise
     except Exception:
         pass
 
@@ -178,112 +528,356 @@ def try_set_tipo_agendamento(driver, desired: str = "Agendamento", timeout: int
         candidates = modal.find_elements(
             By.XPATH,
             './/*[self::label or self::span or self::div or self::button or self::a or self::li]'
-            '[contains(normalize-space(), "%s")]' % desired
+            f'[contains(normalize-space(), {_xpath_literal(desired)})]'
         )
         for el in candidates:
             try:
                 if el.is_displayed() and el.is_enabled():
                     el.click()
-                    if delay > 0: time.sleep(delay)
-                    print("✓ Tipo de agendamento selecionado via componente custom.")
-                    return
+                    return "custom"
             except Exception:
                 continue
+    except StaleElementReferenceException:
+        raise
     except Exception:
         pass
+    return None
+
+
+@_retry_on_stale()
+def try_set_tipo_agendamento(driver, desired: str = "Agendamento", timeout: int = 6, delay: float = 0.0) -> None:
+    """Tenta definir o 'Tipo' para 'Agendamento' em diferentes UIs (select, radios, custom).
+       Se não encontrar, assume que o padrão já é 'Agendamento' e segue sem erro.
+    """
+    wait = fast_wait(driver, timeout)
+
+    # Escopo: o modal do agendamento
+    modal = wait.until(EC.presence_of_element_located(MODAL_LOCATOR))
+
+    # Uma única chamada JS; se o script falhar, percorre os elementos via Selenium
+    try:
+        how = driver.execute_script(_SET_TIPO_JS, modal, desired)
+    except StaleElementReferenceException:
+        # Modal re-renderizado: o @_retry_on_stale localiza de novo
+        raise
+    except Exception:
+        how = _set_tipo_by_elements(modal, desired)
+
+    if how == "select":
+        _tick(delay)
+        logger.info("✓ Tipo de agendamento selecionado via <select>.")
+        return
+    if how == "custom":
+        _tick(delay)
+        logger.info("✓ Tipo de agendamento selecionado via componente custom.")
+        return
 
     # 3) Se nada encontrado, não falhe — assuma padrão e registre
-    print(f"ℹ️ Campo 'Tipo' não encontrado/necessário. Assumindo padrão '{desired}'.")
+    logger.info("ℹ️ Campo 'Tipo' não encontrado/necessário. Assumindo padrão '%s'.", desired)
 
 
+@_retry_on_stale()
 def _set_date_time_fields(driver, dt: datetime, start_time: str, end_time: str):
     """Define campos de data/hora de forma resiliente (inputs nativos ou mascarados)."""
-
-    # DATA
-    date_input = _first_visible_by_name(driver, "age_data")
-    date_type = (date_input.get_attribute("type") or "").lower()
-    print(f"Tipo do campo de data: '{date_type or 'desconhecido'}'")
+    fields = _find_fields(driver, ("age_data", "age_inicio", "age_fim"))
+    date_input, date_type = fields["age_data"]
+    start_input, _ = fields["age_inicio"]
+    end_input, _ = fields["age_fim"]
+    logger.debug("Tipo do campo de data: '%s'", date_type or "desconhecido")
 
     ddmmyyyy = dt.strftime("%d/%m/%Y")
     iso_date = dt.strftime("%Y-%m-%d")
+    digits = dt.strftime("%d%m%Y")
 
-    try:
-        date_input.click(); time.sleep(0.15)
-    except ElementNotInteractableException:
-        driver.execute_script("arguments[0].focus()", date_input)
-
+    # <input type="date"> exige ISO; inputs mascarados aceitam o valor já formatado
     if date_type == "date":
-        # Para <input type="date">, defina ISO
-        _set_with_js(driver, date_input, iso_date)
-        _wait_until_value(driver, date_input, iso_date, timeout=10)
+        date_value, date_expected = iso_date, iso_date
     else:
-        # Inputs mascarados: digite apenas dígitos para a máscara formatar
-        _clear(date_input)
-        digits = dt.strftime("%d%m%Y")
-        for ch in digits:
-            date_input.send_keys(ch)
-            time.sleep(0.02)
-        date_input.send_keys(Keys.TAB)
-        _wait_until_value(driver, date_input, [ddmmyyyy, iso_date], timeout=10)
-
-    # HORA INÍCIO
-    start_input = _first_visible_by_name(driver, "age_inicio")
-    start_type = (start_input.get_attribute("type") or "").lower()
+        date_value, date_expected = ddmmyyyy, [ddmmyyyy, iso_date]
+
+    _set_many_with_js(driver, [
+        (date_input, date_value),
+        (start_input, start_time),
+        (end_input, end_time),
+    ])
+    # Confere os três valores juntos; só digita nos campos que a máscara rejeitou
+    fallbacks = [
+        (date_input, digits, date_expected, 10),
+        (start_input, start_time.replace(":", ""), start_time, 8),
+        (end_input, end_time.replace(":", ""), end_time, 8),
+    ]
+    for i in _pending_values(driver, [(el, expected) for el, _, expected, _ in fallbacks]):
+        element, typed, expected, timeout = fallbacks[i]
+        _type_value(driver, element, typed, expected, timeout)
+
+
+# ========================= Fluxo CashBarber =========================
+
+# Arquivo opcional (CASHBARBER_SESSION_FILE) onde as sessões sobrevivem a
+# reinícios do processo; gravado com permissão 0600 e sem a senha.
+SESSION_FILE = os.environ.get("CASHBARBER_SESSION_FILE", "")
+# Versão do formato do SESSION_FILE; arquivos de outra versão são ignorados
+_SESSION_FILE_VERSION = 2
+
+# Segredo das chaves de sessão (HMAC), gerado uma vez com permissão 0600.
+# Fica junto dos perfis do Chrome, que guardam as sessões marcadas com ele;
+# sem CASHBARBER_SECRET_FILE nem CHROME_PROFILE_ROOT vale só para o processo.
+_profile_root = os.environ.get("CHROME_PROFILE_ROOT", "/tmp/cashbarber-profile")
+SECRET_FILE = os.environ.get("CASHBARBER_SECRET_FILE") or (
+    os.path.join(_profile_root, "session.key") if _profile_root else ""
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _session_secret() -> bytes:
+    """Lê o segredo do SECRET_FILE, criando-o na primeira vez.
+
+    O arquivo é escrito por inteiro num temporário e ligado no lugar final,
+    então um processo concorrente nunca lê um segredo pela metade.
+    """
+    if not SECRET_FILE:
+        return os.urandom(32)
     try:
-        start_input.click(); time.sleep(0.1)
-    except ElementNotInteractableException:
-        driver.execute_script("arguments[0].focus()", start_input)
+        try:
+            with open(SECRET_FILE, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(SECRET_FILE) or ".", mode=0o700, exist_ok=True)
+        tmp = f"{SECRET_FILE}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(32))
+        try:
+            os.link(tmp, SECRET_FILE)
+        except FileExistsError:
+            # Outro processo criou o segredo primeiro; vale o dele
+            pass
+        finally:
+            os.unlink(tmp)
+        with open(SECRET_FILE, "rb") as f:
+            return f.read()
+    except OSError as e:
+        logger.warning("ℹ️ Segredo das sessões indisponível em disco (%s); usando um só deste processo.", e)
+        return os.urandom(32)
+
+
+def session_key(email: str, password: str) -> str:
+    """Chave da sessão: HMAC das credenciais sob o segredo local.
+
+    A chave vai para o localStorage do painel e para o SESSION_FILE; sem o
+    segredo ela não serve para testar senhas offline.
+    """
+    return hmac.new(_session_secret(), f"{email}\n{password}".encode(), hashlib.sha256).hexdigest()
 
-    if start_type == "time":
-        _set_with_js(driver, start_input, start_time)
-        _wait_until_value(driver, start_input, start_time, timeout=8)
-    else:
-        _clear(start_input)
-        for ch in start_time.replace(":", ""):
-            start_input.send_keys(ch)
-            time.sleep(0.02)
-        start_input.send_keys(Keys.TAB)
-        _wait_until_value(driver, start_input, start_time, timeout=8)
-
-    # HORA FIM
-    end_input = _first_visible_by_name(driver, "age_fim")
-    end_type = (end_input.get_attribute("type") or "").lower()
+
+def _load_sessions() -> dict:
+    if not SESSION_FILE:
+        return {}
+    try:
+        with open(SESSION_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Arquivos antigos eram indexados por um SHA-256 sem segredo: descartados
+    if not isinstance(data, dict) or data.get("version") != _SESSION_FILE_VERSION:
+        return {}
+    return data.get("sessions") or {}
+
+
+def _persist_sessions() -> None:
+    """Grava `_SESSION_CACHE` no SESSION_FILE (troca atômica). Chamar com `_SESSION_LOCK`."""
+    if not SESSION_FILE:
+        return
+    tmp = f"{SESSION_FILE}.tmp"
     try:
-        end_input.click(); time.sleep(0.1)
-    except ElementNotInteractableException:
-        driver.execute_script("arguments[0].focus()", end_input)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": _SESSION_FILE_VERSION, "sessions": _SESSION_CACHE}, f)
+        os.replace(tmp, SESSION_FILE)
+    except OSError as e:
+        logger.warning("ℹ️ Não foi possível gravar as sessões em disco: %s", e)
 
-    if end_type == "time":
-        _set_with_js(driver, end_input, end_time)
-        _wait_until_value(driver, end_input, end_time, timeout=8)
-    else:
-        _clear(end_input)
-        for ch in end_time.replace(":", ""):
-            end_input.send_keys(ch)
-            time.sleep(0.02)
-        end_input.send_keys(Keys.TAB)
-        _wait_until_value(driver, end_input, end_time, timeout=8)
 
+# Sessões autenticadas, por session_key(email, senha): cookies + localStorage.
+_SESSION_CACHE = _load_sessions()
+_SESSION_LOCK = threading.Lock()
 
-# ========================= Fluxo CashBarber =========================
 
-def login_to_cashbarber(driver: webdriver.Chrome, email: str, password: str, timeout: int = 20, delay: float = 0.0) -> None:
-    """Autentica o usuário no painel CashBarber."""
-    driver.get("https://painel.cashbarber.com.br/auth/login")
-    wait = WebDriverWait(driver, timeout)
-    print("Aguardando campo de e-mail...")
-    email_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'input[placeholder="Informe o seu e-mail"]')))
-    print("Aguardando campo de senha...")
-    password_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'input[placeholder="Informe sua senha"]')))
-
-    print("Preenchendo credenciais...")
-    email_input.clear(); email_input.send_keys(email)
-    password_input.clear(); password_input.send_keys(password)
-
-    print("Aguardando botão de login...")
-    login_button = wait.until(EC.element_to_be_clickable((By.XPATH, '//button[contains(normalize-space(), "Acessar")]')))
-    print("Clicando no botão de login...")
+# Chave no localStorage que identifica a conta dona da sessão do navegador:
+# os perfis persistentes do Chrome são reaproveitados entre credenciais.
+_OWNER_STORAGE_KEY = "cashbarber_agendador.owner"
+
+
+def _save_session(driver, email: str, password: str) -> None:
+    """Guarda cookies e localStorage do login atual para reuso em outros drivers."""
+    key = session_key(email, password)
+    try:
+        storage = driver.execute_script(
+            "localStorage.setItem(arguments[0], arguments[1]); return JSON.stringify(localStorage)",
+            _OWNER_STORAGE_KEY, key)
+        session = {"cookies": driver.get_cookies(), "storage": storage}
+    except Exception as e:
+        logger.warning("ℹ️ Não foi possível guardar a sessão: %s", e)
+        return
+    with _SESSION_LOCK:
+        _SESSION_CACHE[key] = session
+        _persist_sessions()
+
+
+# "login" se o painel mandou para /auth/login ou mostra o formulário; "painel"
+# se a página terminou de carregar fora dele; null enquanto não dá para dizer
+_PANEL_STATE_JS = """
+    if (location.pathname.includes('/auth/login') || document.querySelector(arguments[0])) return 'login';
+    return document.readyState === 'complete' ? 'painel' : null;
+"""
+
+# Segundos que a página precisa ficar fora do login depois de carregada para
+# contar como painel: o painel pode mandar uma sessão expirada para o login
+# pelo próprio JS, depois do carregamento.
+PANEL_SETTLE = float(os.environ.get("CASHBARBER_PANEL_SETTLE", 1.5))
+
+
+def _panel_state(driver, timeout: int) -> str:
+    """Espera o painel carregar ou o login ser pedido; devolve "painel" ou "login"."""
+    since = []
+
+    def _state(d):
+        state = d.execute_script(_PANEL_STATE_JS, EMAIL_INPUT_LOCATOR[1])
+        if state != "painel":
+            since.clear()
+            return state or False
+        if not since:
+            since.append(time.monotonic())
+        return "painel" if time.monotonic() - since[0] >= PANEL_SETTLE else False
+
+    try:
+        return fast_wait(driver, timeout).until(_state)
+    except TimeoutException:
+        return "login"
+
+
+def _panel_open_for(driver, key: str, timeout: int) -> bool:
+    """Abre o painel e diz se a sessão atual do navegador pertence à conta `key`."""
+    navigate(driver, BASE_URL)
+    if _panel_state(driver, timeout) != "painel":
+        return False
+    owner = driver.execute_script("return localStorage.getItem(arguments[0])", _OWNER_STORAGE_KEY)
+    if owner == key:
+        return True
+    # Perfil logado com outra conta: sai dela antes do login com estas credenciais
+    driver.delete_all_cookies()
+    driver.execute_script("localStorage.clear(); sessionStorage.clear();")
+    return False
+
+
+def _restore_session(driver, email: str, password: str, timeout: int = 8) -> bool:
+    """Reaproveita a sessão já presente no perfil do Chrome ou reaplica uma sessão
+    guardada, confirmando que o painel abre sem login."""
+    key = session_key(email, password)
+    # Perfil persistente (CHROME_PROFILE_ROOT) ainda logado nesta conta
+    if _panel_open_for(driver, key, timeout):
+        return True
+    session = _SESSION_CACHE.get(key)
+    if not session:
+        return False
+
+    # Já estamos no domínio do painel, onde os cookies podem ser definidos
+    for cookie in session["cookies"]:
+        try:
+            driver.add_cookie(cookie)
+        except Exception:
+            continue
+    driver.execute_script("Object.assign(localStorage, JSON.parse(arguments[0] || '{}'))", session["storage"])
+    if _panel_open_for(driver, key, timeout):
+        return True
+    # Sessão expirada: descarta e deixa o login completo acontecer
+    with _SESSION_LOCK:
+        if _SESSION_CACHE.pop(key, None) is not None:
+            _persist_sessions()
+    return False
+
+
+def forget_session(driver, email: str, password: str) -> None:
+    """Descarta a sessão destas credenciais: a guardada e a do perfil do Chrome.
+
+    Para um fluxo que falhou, em que a sessão pode ter expirado sem que o
+    painel tenha pedido login; o próximo driver faz o login completo. A
+    limpeza do navegador é a melhor possível (ele pode já estar morto).
+    """
+    key = session_key(email, password)
+    with _SESSION_LOCK:
+        if _SESSION_CACHE.pop(key, None) is not None:
+            _persist_sessions()
+    try:
+        driver.delete_all_cookies()
+        driver.execute_script("localStorage.removeItem(arguments[0])", _OWNER_STORAGE_KEY)
+    except Exception:
+        pass
+
+
+class LoginError(RuntimeError):
+    """O painel recusou as credenciais informadas."""
+
+
+# Texto da primeira mensagem de erro de login visível, senão null
+_LOGIN_ERROR_JS = """
+    for (const el of document.querySelectorAll(arguments[0])) {
+        if (!el.getClientRects().length || getComputedStyle(el).visibility === 'hidden') continue;
+        const text = (el.innerText || '').trim();
+        if (text) return text;
+    }
+    return null;
+"""
+
+
+def login_to_cashbarber(driver: webdriver.Chrome, email: str, password: str, timeout: int = 20, delay: float = 0.0,
+                        reuse_session: bool = True) -> None:
+    """Autentica o usuário no painel CashBarber.
+
+    Com `reuse_session`, aproveita primeiro a sessão que o perfil do Chrome já
+    tiver para estas credenciais e, na falta dela, a de um login anterior (neste
+    processo ou, com CASHBARBER_SESSION_FILE, em execuções anteriores); o
+    formulário só é preenchido se nenhuma estiver válida.
+
+    Levanta LoginError se o painel recusar as credenciais.
+    """
+    if reuse_session and _restore_session(driver, email, password):
+        logger.info("✓ Sessão reaproveitada; login dispensado.")
+        return
+
+    # A verificação da sessão pode já ter parado no formulário de login
+    if not driver.find_elements(*EMAIL_INPUT_LOCATOR):
+        navigate(driver, LOGIN_URL)
+    wait = fast_wait(driver, timeout)
+    # Uma única espera: com o botão "Acessar" clicável o formulário está pronto
+    logger.info("Aguardando formulário de login...")
+    login_button = wait.until(EC.element_to_be_clickable(LOGIN_BUTTON_LOCATOR))
+    email_input = driver.find_element(*EMAIL_INPUT_LOCATOR)
+    password_input = driver.find_element(*PASSWORD_INPUT_LOCATOR)
+
+    logger.info("Preenchendo credenciais...")
+    _set_many_with_js(driver, [(email_input, email), (password_input, password)])
+    try:
+        _wait_until_value(driver, email_input, email, timeout=2)
+    except TimeoutException:
+        # O formulário reformatou/rejeitou o valor via JS: digita como antes
+        email_input.clear(); email_input.send_keys(email)
+        password_input.clear(); password_input.send_keys(password)
+
+    logger.info("Clicando no botão de login...")
     login_button.click()
 
-    print("Aguardando o carregamento do painel de controle...")
-    wait.until(EC.presence_of_element_located((By.XPATH, '//span[contains
+    logger.info("Aguardando o carregamento do painel de controle...")
+    # Painel ou mensagem de erro, o que vier primeiro: credenciais recusadas
+    # falham na hora em vez de esgotar o timeout
+    outcome = wait.until(EC.any_of(
+        # O painel sai de /auth/login assim que a autenticação é aceita.
+        lambda d: "/auth/login" not in d.current_url,
+        lambda d: d.execute_script(_LOGIN_ERROR_JS, LOGIN_ERROR_CSS),
+    ))
+    if isinstance(outcome, str):
+        raise LoginError(f"Login recusado pelo painel: {outcome}")
+    _tick(delay)
+    logger.info("✓ Login realizado.")
+    _save_session(driver, email, password)
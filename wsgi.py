@@ -0,0 +1,33 @@
+# Ponto de entrada WSGI da API CashBarber.
+#
+# Em produção o ``app`` é servido pelo Gunicorn com workers ``gthread``
+# (ver Dockerfile): o trabalho com Selenium passa a maior parte do tempo
+# bloqueado esperando o ChromeDriver, então threads permitem atender vários
+# agendamentos em paralelo no mesmo processo e compartilhar o pool de drivers.
+
+import logging
+import os
+
+# Antes de importar a API, para que os logs do aquecimento do pool apareçam.
+# LOG_LEVEL=WARNING silencia o passo a passo de cada agendamento; DEBUG
+# (ou CASHBARBER_DEBUG=1) liga também a leitura dos campos do formulário.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+_level_valid = LOG_LEVEL in logging.getLevelNamesMapping()
+logging.basicConfig(
+    level=LOG_LEVEL if _level_valid else logging.INFO,
+    format="%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s",
+)
+if not _level_valid:
+    # Um erro de digitação não deve impedir o serviço de subir
+    logging.getLogger(__name__).warning("LOG_LEVEL inválido %r; usando INFO.", LOG_LEVEL)
+
+from api import app, start_background_tasks  # noqa: E402
+
+# Navegadores de reserva e pool aquecido (Gunicorn importa este módulo uma
+# vez por worker)
+start_background_tasks()
+
+if __name__ == "__main__":
+    # Servidor de desenvolvimento; use Gunicorn em produção.
+    port = int(os.environ.get("PORT", 5000))
+    app.run(host="0.0.0.0", port=port, debug=False, threaded=True)